@@ -1,23 +1,46 @@
+import time
+
+# Taken before the imports so the first run of a fresh process includes their cost
+RUN_STARTED = time.perf_counter()
+
 import streamlit as st
-import google.generativeai as genai
 import os
-import whisper
-import re
 import html
-import asyncio
-import edge_tts
+import re
+import wave
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from audio_recorder_streamlit import audio_recorder
 from dotenv import load_dotenv
+import metrics
+from audio_store import AUDIO_PORT, audio_url, start_audio_server
+from debate_engine import DEFAULT_ROUNDS, MAX_ROUNDS, DebateSession, get_audio_store, get_gemini_model, get_session_store, get_tts_cache, preload_modules, speech_seconds
+from transcription import decode_wav_bytes, load_whisper_model, max_parallel_transcriptions, split_on_silence, transcribe_audio_bytes, transcribe_samples, trim_silence
 
 # --- CONFIGURATION ---
 os.environ["PATH"] += os.pathsep + r"C:\ffmpeg\bin"
 load_dotenv()
 
+SHOW_DEBUG_PANEL = os.getenv("SHOW_DEBUG_PANEL", "0") == "1"
+
+WHISPER_WORKERS = max_parallel_transcriptions(int(os.getenv("WHISPER_WORKERS", "1")))
+WHISPER_QUEUE_SIZE = int(os.getenv("WHISPER_QUEUE_SIZE", "8"))
+WHISPER_PRELOAD = os.getenv("WHISPER_PRELOAD", "1") == "1"
+PRELOAD_MODULES = os.getenv("PRELOAD_MODULES", "1") == "1"
+# Rounds before this many from the current one are only rendered on request
+RENDER_RECENT_ROUNDS = int(os.getenv("RENDER_RECENT_ROUNDS", "3"))
+
 st.set_page_config(page_title="AI Debate Trainer", page_icon="🎙️", layout="wide")
 
 # --- CSS STYLING ---
+@st.cache_data
+def minify_css(css):
+    # The style block is re-sent on every rerun; strip it once per process
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    return re.sub(r"\s+", " ", css).strip()
+
 st.markdown(
-    """
+    minify_css("""
 <style>
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;600;700&display=swap');
 
@@ -149,172 +172,301 @@ st.markdown(
     }
     
 </style>
-""",
+"""),
     unsafe_allow_html=True,
 )
 
 # --- STATE INITIALIZATION ---
 if "debate_started" not in st.session_state:
     st.session_state.debate_started = False
-if "current_round" not in st.session_state:
-    st.session_state.current_round = 1
-if "debate_history" not in st.session_state:
-    st.session_state.debate_history = []
+if "debate" not in st.session_state:
+    st.session_state.debate = None
 if "api_key" not in st.session_state:
     st.session_state.api_key = os.getenv("GEMINI_API_KEY")
 if "user_input_text" not in st.session_state:
     st.session_state.user_input_text = ""
 if "last_audio_bytes" not in st.session_state:
     st.session_state.last_audio_bytes = None
-if "audio_to_play" not in st.session_state:
-    st.session_state.audio_to_play = None
-if "evaluation_report" not in st.session_state:
-    st.session_state.evaluation_report = None
+if "pending_user_argument" not in st.session_state:
+    st.session_state.pending_user_argument = None
+if "pending_errors" not in st.session_state:
+    st.session_state.pending_errors = []
+if "card_html" not in st.session_state:
+    st.session_state.card_html = {}
+if "audio_already_played" not in st.session_state:
+    st.session_state.audio_already_played = None
+
+# The sidebar key input only exists until a key is known; take it here so the rest of
+# this run (including a resume below) already sees it
+if not st.session_state.api_key and st.session_state.get("api_key_input"):
+    st.session_state.api_key = st.session_state.api_key_input
+
+# A debate lives in the session store under the id in the URL, so a reconnect that lands
+# on another app process (or a restarted one) picks it up where it left off. The key is
+# never stored, so resuming waits until one has been entered.
+if st.session_state.debate is None and "session" in st.query_params and st.session_state.api_key:
+    saved = get_session_store().load(st.query_params["session"])
+    if saved:
+        st.session_state.debate = DebateSession.from_dict(saved, st.session_state.api_key)
+        st.session_state.debate_started = True
+        st.session_state.card_html = {}
+    else:
+        del st.query_params["session"]
 
 
 # --- HELPER FUNCTIONS ---
 def configure_gemini(api_key):
     try:
-        genai.configure(api_key=api_key)
+        get_gemini_model(api_key)
         return True
     except Exception as e:
         st.error(f"Error configuring API: {e}")
         return False
 
 @st.cache_resource
-def load_whisper_model():
-    return whisper.load_model("base")
+def get_transcription_executor():
+    return ThreadPoolExecutor(max_workers=WHISPER_WORKERS, thread_name_prefix="whisper")
 
-def clean_text_content(text):
-    clean = re.sub(r'<[^>]*>', '', text)
-    return clean.strip()
+@st.cache_resource
+def get_transcription_slots():
+    return threading.BoundedSemaphore(WHISPER_WORKERS + WHISPER_QUEUE_SIZE)
 
-async def generate_speech_async(text, voice="en-US-ChristopherNeural"):
-    communicate = edge_tts.Communicate(text, voice)
-    filename = "temp_output.mp3"
-    await communicate.save(filename)
-    return filename
+@st.cache_resource
+def start_whisper_warmup():
+    return get_transcription_executor().submit(load_whisper_model)
 
-def generate_speech(text):
+@st.cache_resource
+def start_module_preload():
+    return preload_modules()
+
+def reserve_transcription_slot():
+    # Recordings from every session share one bounded pool so they queue instead of contending
+    slots = get_transcription_slots()
+    if not slots.acquire(blocking=False):
+        raise RuntimeError("Transcription queue is full, please try again in a moment.")
+    return slots
+
+def submit_transcription(audio_bytes):
+    slots = reserve_transcription_slot()
+    future = get_transcription_executor().submit(transcribe_audio_bytes, audio_bytes)
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+def stream_transcription(audio_bytes):
+    # Windows are yielded in order, so text for the start of a long argument shows before
+    # the end is decoded. They only decode in parallel with faster-whisper and
+    # WHISPER_WORKERS > 1; otherwise the total time is the same as a single pass.
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        filename = loop.run_until_complete(generate_speech_async(text))
-        return filename
-    except Exception as e:
-        st.error(f"TTS Error: {e}")
-        return None
+        audio = decode_wav_bytes(audio_bytes)
+    except (wave.Error, ValueError):
+        yield submit_transcription(audio_bytes).result()
+        return
 
-def get_ai_response(topic, user_role, ai_role, debate_history, user_argument):
-    try:
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        history_context = "\n".join(
-            [f"Round {h['round']} - {h['speaker']}: {clean_text_content(h['argument'])}" for h in debate_history]
-        )
-        prompt = f"""You are in a debate about: "{topic}"
-Role: {ai_role} | Opponent: {user_role}
-
-History:
-{history_context}
-
-Opponent's latest argument:
-{user_argument}
-
-Reply with a counter-argument.
-1. Be persuasive and logical.
-2. Keep it under 150 words.
-3. Address the specific point made.
-4. STRICTLY OUTPUT PLAIN TEXT ONLY. DO NOT USE MARKDOWN OR HTML.
-"""
-        response = model.generate_content(prompt)
-        return clean_text_content(response.text)
-    except Exception as e:
-        return f"Error: {e}"
+    audio = trim_silence(audio)
+    if not len(audio):
+        return
 
-def evaluate_debate_performance(topic, user_role, debate_history):
+    slots = reserve_transcription_slot()
     try:
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        user_args = [h for h in debate_history if h["speaker"] == "You"]
-        context = "\n\n".join(
-            [f"Round {h['round']}:\n{h['argument']}" for h in user_args]
-        )
-        prompt = f"""Act as a strict debate coach.
-Topic: {topic}
-Side: {user_role}
-
-Here are the user's arguments:
-{context}
-
-Provide a performance review. 
-1. Assign a score (0-100) for EACH round based on logic.
-2. Calculate the 'Overall Score' by taking the AVERAGE of the round scores.
-3. STRICTLY OUTPUT PLAIN TEXT ONLY.
-
-Format:
-Overall Score: [Average Score]/100
-
-Round 1:
-Score: [0-100]
-Feedback: [Your feedback]
-"""
-        response = model.generate_content(prompt)
-        return clean_text_content(response.text)
-    except Exception as e:
-        return f"Error: {e}"
+        executor = get_transcription_executor()
+        jobs = [executor.submit(transcribe_samples, audio[start:end]) for start, end in split_on_silence(audio)]
+        for job in jobs:
+            text = job.result()
+            if text:
+                yield text
+    finally:
+        slots.release()
+
+def build_card_html(speaker, round_num, text):
+    is_user = speaker == "You"
+    css_class = "user-card" if is_user else "ai-card"
+    icon = "👤 You" if is_user else "🤖 AI Opponent"
+    safe_arg = html.escape(text)
+    return f"""
+            <div class="chat-card {css_class}">
+                <div class="card-header">
+                    <span>{icon}</span>
+                    <span style="opacity:0.6">Round {round_num}</span>
+                </div>
+                <div class="card-content">{safe_arg}</div>
+            </div>
+            """
+
+def get_card_html(entry):
+    # Finished entries never change, so each card is built once and reused on every rerun
+    card = st.session_state.card_html.get(entry["id"])
+    if card is None:
+        card = build_card_html(entry["speaker"], entry["round"], entry["argument"])
+        st.session_state.card_html[entry["id"]] = card
+    return card
+
+def save_debate():
+    debate = st.session_state.debate
+    get_session_store().save(debate.session_id, debate.to_dict())
+
+def end_debate():
+    get_session_store().delete(st.session_state.debate.session_id)
+    st.query_params.clear()
+    st.session_state.debate_started = False
+    st.session_state.debate = None
+    st.session_state.user_input_text = ""
+    st.session_state.pending_user_argument = None
+    st.session_state.audio_already_played = None
+
+def stream_ai_turn(placeholder, user_argument):
+    debate = st.session_state.debate
+    round_num = debate.current_round
+    first_audio_player = st.empty()
+    first_audio = {}
+
+    def show_partial(partial):
+        placeholder.markdown(build_card_html("AI", round_num, partial + " ▌"), unsafe_allow_html=True)
+
+    def play_first_audio(clip):
+        # The first sentence starts speaking while the rest of the reply streams in
+        first_audio["clip"] = clip
+        first_audio["ends_at"] = time.monotonic() + speech_seconds(clip)
+        first_audio_player.audio(clip, format="audio/mp3", autoplay=True)
+
+    if user_argument is None:
+        _, audio_bytes = debate.opening_statement(show_partial, play_first_audio)
+    else:
+        _, audio_bytes = debate.respond(user_argument, show_partial, play_first_audio)
+
+    placeholder.markdown(get_card_html(debate.history[-1]), unsafe_allow_html=True)
+    if debate.tts_error:
+        # Shown on the rerun that follows, which would otherwise wipe it straight away
+        st.session_state.pending_errors.append(f"TTS Error: {debate.tts_error}")
+    if audio_bytes:
+        # Only the short key stays with the session; the clip lives on disk
+        store = get_audio_store()
+        debate.audio_key = store.put(audio_bytes)
+        first_clip = first_audio.get("clip")
+        if first_clip and audio_bytes.startswith(first_clip):
+            # The sticky player picks up after the sentence that already played
+            rest = audio_bytes[len(first_clip):]
+            st.session_state.audio_already_played = (debate.audio_key, store.put(rest) if rest else None)
+            # Let that sentence finish before the rerun removes its player
+            time.sleep(max(0.0, first_audio["ends_at"] - time.monotonic()))
+    save_debate()
 
 def process_debate_turn():
     user_text = st.session_state.user_input_text
     
     if user_text and user_text.strip():
-        st.session_state.debate_history.append({
-            "round": st.session_state.current_round, "speaker": "You", "role": st.session_state.user_role, "argument": user_text
-        })
-
-        try:
-            ai_reply = get_ai_response(st.session_state.topic, st.session_state.user_role, st.session_state.ai_role, st.session_state.debate_history, user_text)
-            
-            st.session_state.debate_history.append({
-                "round": st.session_state.current_round, "speaker": "AI", "role": st.session_state.ai_role, "argument": ai_reply
-            })
-            
-            audio_file = generate_speech(ai_reply)
-            if audio_file:
-                with open(audio_file, "rb") as f:
-                    st.session_state.audio_to_play = f.read()
-            
-            st.session_state.current_round += 1
-            st.session_state.user_input_text = ""
-
-            if st.session_state.current_round > 3:
-                with st.spinner("Debate complete! Coach is grading your performance..."):
-                    report = evaluate_debate_performance(
-                        st.session_state.topic,
-                        st.session_state.user_role,
-                        st.session_state.debate_history
-                    )
-                    st.session_state.evaluation_report = report
-            
-        except Exception as e:
-            st.error(f"Error AI: {e}")
+        with metrics.span("submit_turn"):
+            st.session_state.debate.submit_argument(user_text)
+            save_debate()
+        # The AI reply is streamed into the chat container on the rerun this callback triggers
+        st.session_state.pending_user_argument = user_text
+        st.session_state.user_input_text = ""
     else:
         st.warning("Argument cannot be empty!")
 
+def finish_debate_turn(placeholder):
+    debate = st.session_state.debate
+    user_text = st.session_state.pending_user_argument
+    st.session_state.pending_user_argument = None
+
+    try:
+        with metrics.span("ai_turn"):
+            stream_ai_turn(placeholder, user_text)
+
+            if debate.current_round == debate.max_rounds:
+                with st.spinner("Debate complete! Coach is grading your performance..."):
+                    debate.advance_round()
+            else:
+                debate.advance_round()
+        
+    except Exception as e:
+        st.session_state.pending_errors.append(f"Error AI: {e}")
+    save_debate()
+    st.rerun()
+
+
+@st.fragment
+def render_input_area():
+    # Recording, transcribing and typing only rerun this region, not the chat and sidebar
+    st.write(f"### 🗣️ Your Turn")
+    
+    c1, c2 = st.columns([7, 1])
+    
+    with c2:
+        st.write("**Record**")
+        audio_bytes = audio_recorder(text="", recording_color="#ef4444", neutral_color="#3b82f6", icon_name="microphone", icon_size="2x")
+
+    # Transcription logic
+    if audio_bytes and audio_bytes != st.session_state.get("last_audio_bytes"):
+        st.session_state.last_audio_bytes = audio_bytes
+        try:
+            with st.spinner("Transcribing audio..."), metrics.span("transcription", audio_bytes=len(audio_bytes)) as attrs:
+                partial_transcript = st.empty()
+                transcript = ""
+                for text in stream_transcription(audio_bytes):
+                    transcript = f"{transcript} {text}".strip()
+                    partial_transcript.caption(f"📝 {transcript}")
+                attrs["words"] = len(transcript.split())
+            if transcript:
+                st.session_state.user_input_text = transcript
+                st.rerun(scope="fragment")
+            # Silent clips are dropped before Whisper; say so rather than leaving the box empty
+            st.warning("No speech was detected in that recording. Try again a little closer to the microphone.")
+        except Exception as e: st.error(f"Error: {e}")
+
+    with c1:
+        # ADDED PLACEHOLDER HERE
+        st.text_area("Draft your argument here...", key="user_input_text", height=120, label_visibility="collapsed", placeholder="Give your arguments...")
+
+    # BUTTON IS NOW FULL WIDTH OUTSIDE COLUMNS
+    st.markdown("<br>", unsafe_allow_html=True)
+    st.button("Submit Argument 📤", use_container_width=True, type="primary", on_click=process_debate_turn)
+    if st.session_state.pending_user_argument:
+        # The reply streams into the chat history, which lives outside this fragment
+        st.rerun()
+        
+    st.markdown('</div>', unsafe_allow_html=True) # End Input Container
+
+@st.fragment
+def render_audio_player():
+    audio_key = st.session_state.debate.audio_key
+    already_played = st.session_state.audio_already_played
+    if already_played and already_played[0] == audio_key:
+        audio_key = already_played[1]
+    if not audio_key:
+        return
+    # With the audio server the browser fetches (and range-requests) the clip itself,
+    # so the MP3 never rides the websocket or sits in this process's memory
+    source = audio_url(audio_key) if AUDIO_PORT else get_audio_store().get(audio_key)
+    if source:
+        st.markdown('<div class="audio-sticky-wrapper">', unsafe_allow_html=True)
+        
+        st.markdown('<div class="audio-container">', unsafe_allow_html=True)
+        st.markdown('<span class="audio-label">🔊 AI Speaking:</span>', unsafe_allow_html=True)
+        st.audio(source, format="audio/mp3", autoplay=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+
+
+if WHISPER_PRELOAD:
+    start_whisper_warmup()
+if PRELOAD_MODULES:
+    start_module_preload()
+
+metrics.start_metrics_server()
+start_audio_server(get_audio_store())
+
 
 # --- MODAL: EVALUATION ---
 @st.dialog("📊 Debate Evaluation", width="large")
 def show_review_dialog():
-    if st.session_state.evaluation_report:
-        st.info(st.session_state.evaluation_report, icon="📝")
+    if st.session_state.debate.evaluation_report:
+        st.info(st.session_state.debate.evaluation_report, icon="📝")
     else:
         st.error("Report not found. Please try finishing the round again.")
 
     if st.button("Finish & Start Over", type="primary", use_container_width=True):
-        st.session_state.debate_started = False
-        st.session_state.debate_history = []
-        st.session_state.current_round = 1
-        st.session_state.user_input_text = ""
-        st.session_state.audio_to_play = None
-        st.session_state.evaluation_report = None
+        end_debate()
         st.rerun()
 
 
@@ -323,11 +475,12 @@ with st.sidebar:
     st.markdown("### 🎛️ Control Panel")
     
     if st.session_state.api_key:
-        configure_gemini(st.session_state.api_key)
         st.success("API Connected", icon="🟢")
     else:
         st.warning("⚠️ API Key Missing")
-        st.session_state.api_key = st.text_input("Gemini API Key", type="password")
+        if "session" in st.query_params:
+            st.info("Enter your API key to resume your saved debate.")
+        st.session_state.api_key = st.text_input("Gemini API Key", type="password", key="api_key_input")
     
     st.divider()
 
@@ -337,130 +490,94 @@ with st.sidebar:
         topic_input = st.text_input("Debate Topic", "Social Media does more harm than good")
         role_input = st.selectbox("Your Position", ["Pro (Agree)", "Con (Disagree)"])
         first_speaker_input = st.selectbox("First Speaker", ["User", "AI"])
+        # st.slider rejects a default above its max and a range with min == max
+        rounds_input = st.slider("Rounds", 1, MAX_ROUNDS, min(DEFAULT_ROUNDS, MAX_ROUNDS)) if MAX_ROUNDS > 1 else 1
 
         st.markdown("") # Spacer
         if st.button("🚀 Start Debate", type="primary", use_container_width=True):
             if st.session_state.api_key:
-                st.session_state.debate_started = True
-                st.session_state.topic = topic_input
-                st.session_state.user_role = role_input
-                st.session_state.first_speaker = first_speaker_input
-                
-                st.session_state.ai_role = "Con" if "Pro" in role_input else "Pro"
-                
-                st.session_state.current_round = 1
-                st.session_state.debate_history = []
-                st.session_state.audio_to_play = None
-                st.session_state.evaluation_report = None
-                st.rerun()
+                # Configured here rather than on every run so the landing page never waits on the Gemini SDK import
+                if configure_gemini(st.session_state.api_key):
+                    st.session_state.debate_started = True
+                    st.session_state.debate = DebateSession(topic_input, role_input, st.session_state.api_key, first_speaker_input, rounds_input)
+                    st.session_state.card_html = {}
+                    save_debate()
+                    st.query_params["session"] = st.session_state.debate.session_id
+                    st.rerun()
             else:
                 st.error("Please enter API Key")
     else:
-        st.info(f"**Topic:** {st.session_state.topic}")
-        st.info(f"**Side:** {st.session_state.user_role}")
+        st.info(f"**Topic:** {st.session_state.debate.topic}")
+        st.info(f"**Side:** {st.session_state.debate.user_role}")
         
         st.markdown("") # Spacer
         if st.button("🔄 End / Reset", type="secondary", use_container_width=True):
-            st.session_state.debate_started = False
-            st.session_state.user_input_text = ""
+            end_debate()
             st.session_state.last_audio_bytes = None
-            st.session_state.audio_to_play = None
-            st.session_state.evaluation_report = None
             st.rerun()
 
+    if SHOW_DEBUG_PANEL:
+        with st.expander("🔧 Debug"):
+            st.caption("TTS cache")
+            st.json(get_tts_cache().stats())
+            snapshot = metrics.REGISTRY.snapshot()
+            st.caption("Stage latency (recent samples)")
+            st.table([{"stage": stage, **stats} for stage, stats in snapshot["stages"].items()])
+            st.caption("Span attributes")
+            st.json(snapshot["attributes"])
+            st.caption("Gauges and counters")
+            st.json({**snapshot["gauges"], **snapshot["counters"]})
+
 
 # --- MAIN CONTENT ---
 if st.session_state.debate_started:
+    debate = st.session_state.debate
     
     # Title with styling
-    st.markdown(f"## 🎙️ Debate: <span style='color:#3b82f6'>{html.escape(st.session_state.topic)}</span>", unsafe_allow_html=True)
+    st.markdown(f"## 🎙️ Debate: <span style='color:#3b82f6'>{html.escape(debate.topic)}</span>", unsafe_allow_html=True)
     
     # Progress Bar / Round indicator styled
-    progress = min(st.session_state.current_round / 3, 1.0)
+    progress = min(debate.current_round / debate.max_rounds, 1.0)
     st.progress(progress)
     
-    if st.session_state.current_round <= 3:
-        st.caption(f"Round {st.session_state.current_round} / 3 | You are: **{st.session_state.user_role}**")
+    if not debate.finished:
+        st.caption(f"Round {debate.current_round} / {debate.max_rounds} | You are: **{debate.user_role}**")
     else:
         st.caption("🏁 Debate Finished")
 
     st.markdown("---")
 
+    # Errors from the last AI turn, carried over the rerun that ended it
+    for message in st.session_state.pending_errors:
+        st.error(message)
+    st.session_state.pending_errors = []
+
     # 4. CHAT HISTORY
     chat_container = st.container()
     
     with chat_container:
-        for entry in st.session_state.debate_history:
-            is_user = entry["speaker"] == "You"
-            css_class = "user-card" if is_user else "ai-card"
-            icon = "👤 You" if is_user else "🤖 AI Opponent"
-            safe_arg = html.escape(entry["argument"])
-
-            st.markdown(
-                f"""
-            <div class="chat-card {css_class}">
-                <div class="card-header">
-                    <span>{icon}</span>
-                    <span style="opacity:0.6">Round {entry["round"]}</span>
-                </div>
-                <div class="card-content">{safe_arg}</div>
-            </div>
-            """,
-                unsafe_allow_html=True,
-            )
+        # Long debates only emit the last few rounds, so a rerun costs the same in round 20 as in round 3
+        recent_from = min(debate.current_round, debate.max_rounds) - RENDER_RECENT_ROUNDS
+        hidden = sum(1 for entry in debate.history if entry["round"] <= recent_from)
+        show_all = hidden and st.toggle(f"Show earlier rounds ({hidden} arguments)", key="show_earlier_rounds")
+        visible = debate.history if show_all else debate.history[hidden:]
 
-    # 5. AI OPENING LOGIC
-    if (st.session_state.first_speaker == "AI" 
-        and st.session_state.current_round == 1 
-        and len(st.session_state.debate_history) == 0):
-        
-        with st.spinner("🤖 AI is preparing opening statement..."):
-            ai_res = get_ai_response(st.session_state.topic, st.session_state.user_role, st.session_state.ai_role, [], "Opening Statement")
-            
-            audio_file = generate_speech(ai_res)
-            if audio_file:
-                with open(audio_file, "rb") as f:
-                    st.session_state.audio_to_play = f.read()
-
-            st.session_state.debate_history.append({
-                "round": 1, "speaker": "AI", "role": st.session_state.ai_role, "argument": ai_res
-            })
-            st.rerun()
+        with metrics.span("render_history", cards=len(visible)):
+            for entry in visible:
+                st.markdown(get_card_html(entry), unsafe_allow_html=True)
 
-    # 6. INPUT AREA OR VIEW REPORT BUTTON
-    if st.session_state.current_round <= 3:
-        st.write(f"### 🗣️ Your Turn")
-        
-        c1, c2 = st.columns([7, 1])
-        
-        with c2:
-            st.write("**Record**")
-            audio_bytes = audio_recorder(text="", recording_color="#ef4444", neutral_color="#3b82f6", icon_name="microphone", icon_size="2x")
-
-        # Transcription logic
-        if audio_bytes and audio_bytes != st.session_state.get("last_audio_bytes"):
-            st.session_state.last_audio_bytes = audio_bytes
-            try:
-                with st.spinner("Transcribing audio..."):
-                    temp_filename = "temp_audio.wav"
-                    with open(temp_filename, "wb") as f: f.write(audio_bytes)
-                    whisper_model = load_whisper_model()
-                    result = whisper_model.transcribe(temp_filename)
-                    if result["text"].strip():
-                        st.session_state.user_input_text = result["text"].strip()
-                    if os.path.exists(temp_filename): os.remove(temp_filename)
-                    st.rerun()
-            except Exception as e: st.error(f"Error: {e}")
+        if st.session_state.pending_user_argument:
+            finish_debate_turn(st.empty())
 
-        with c1:
-            # ADDED PLACEHOLDER HERE
-            st.text_area("Draft your argument here...", key="user_input_text", height=120, label_visibility="collapsed", placeholder="Give your arguments...")
+    # 5. AI OPENING LOGIC
+    if debate.needs_opening:
+        with chat_container, metrics.span("ai_opening_turn"):
+            stream_ai_turn(st.empty(), None)
+        st.rerun()
 
-        # BUTTON IS NOW FULL WIDTH OUTSIDE COLUMNS
-        st.markdown("<br>", unsafe_allow_html=True)
-        st.button("Submit Argument 📤", use_container_width=True, type="primary", on_click=process_debate_turn)
-            
-        st.markdown('</div>', unsafe_allow_html=True) # End Input Container
+    # 6. INPUT AREA OR VIEW REPORT BUTTON
+    if not debate.finished:
+        render_input_area()
     
     else:
         # ROUNDS FINISHED
@@ -471,15 +588,7 @@ if st.session_state.debate_started:
             show_review_dialog()
 
     # 7. STICKY AUDIO PLAYER
-    if st.session_state.audio_to_play:
-        st.markdown('<div class="audio-sticky-wrapper">', unsafe_allow_html=True)
-        
-        st.markdown('<div class="audio-container">', unsafe_allow_html=True)
-        st.markdown('<span class="audio-label">🔊 AI Speaking:</span>', unsafe_allow_html=True)
-        st.audio(st.session_state.audio_to_play, format="audio/mp3", autoplay=True)
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        st.markdown('</div>', unsafe_allow_html=True)
+    render_audio_player()
 
 else:
     # LANDING PAGE
@@ -505,4 +614,10 @@ else:
         st.caption("Powered by Gemini 2.0 Flash, the AI counters your logic with precision and distinct personality.")
     with col3:
         st.markdown("#### 📊 Instant Feedback")
-        st.caption("Get a round-by-round score and a final coaching report after the debate concludes.")
\ No newline at end of file
+        st.caption("Get a round-by-round score and a final coaching report after the debate concludes.")
+
+    if "landing_painted" not in st.session_state:
+        st.session_state.landing_painted = True
+        metrics.record("landing_first_paint", time.perf_counter() - RUN_STARTED)
+
+metrics.record("script_run", time.perf_counter() - RUN_STARTED, debate_active=int(st.session_state.debate_started))
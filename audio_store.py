@@ -0,0 +1,143 @@
+import hashlib
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+from disk_store import DiskBlobStore
+
+load_dotenv()
+
+AUDIO_PORT = int(os.getenv("AUDIO_PORT", "0"))
+AUDIO_HOST = os.getenv("AUDIO_HOST", "0.0.0.0")
+AUDIO_BASE_URL = os.getenv("AUDIO_BASE_URL", f"http://localhost:{AUDIO_PORT}").rstrip("/")
+
+AUDIO_KEY = re.compile(r"^[0-9a-f]{32}$")
+AUDIO_PATH = re.compile(r"^/audio/([0-9a-f]{32})\.mp3$")
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class AudioStore(DiskBlobStore):
+    # Content-addressed MP3 files on local disk, evicted by last access once over budget.
+    # Keys are short enough to keep in session state and safe to put in a URL.
+
+    def __init__(self, directory, budget_bytes=1024 * 1024 * 1024):
+        super().__init__(directory, budget_bytes, suffix=".mp3")
+
+    def path(self, key):
+        if not AUDIO_KEY.match(key):
+            raise ValueError(f"Invalid audio key: {key!r}")
+        return super().path(key)
+
+    def put(self, data):
+        key = hashlib.sha256(data).hexdigest()[:32]
+        self.write(key, data)
+        return key
+
+    def get(self, key):
+        return self.read(key)
+
+
+def parse_byte_range(header, size):
+    # Single ranges only, which is all <audio> elements ask for. Returns (start, end)
+    # inclusive, None for a whole-file response, or raises ValueError if unsatisfiable.
+    match = BYTE_RANGE.match(header.strip()) if header else None
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _make_handler(store):
+    class AudioHandler(BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            self._serve(send_body=False)
+
+        def do_GET(self):
+            self._serve(send_body=True)
+
+        def _serve(self, send_body):
+            match = AUDIO_PATH.match(self.path.split("?")[0])
+            if not match:
+                self.send_error(404)
+                return
+            path = store.path(match.group(1))
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                self.send_error(404)
+                return
+
+            with f:
+                size = os.fstat(f.fileno()).st_size
+                try:
+                    byte_range = parse_byte_range(self.headers.get("Range"), size)
+                except ValueError:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.end_headers()
+                    return
+
+                start, end = byte_range or (0, size - 1)
+                self.send_response(206 if byte_range else 200)
+                if byte_range:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("ETag", f'"{match.group(1)}"')
+                # Content-addressed, so a URL never changes what it points at
+                self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+                self.end_headers()
+                if not send_body:
+                    return
+
+                store.touch(path)
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = f.read(min(64 * 1024, remaining))
+                    if not chunk:
+                        break
+                    try:
+                        self.wfile.write(chunk)
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+                    remaining -= len(chunk)
+
+        def log_message(self, format, *args):
+            pass
+
+    return AudioHandler
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_audio_server(store, port=AUDIO_PORT, host=AUDIO_HOST):
+    # Serves /audio/<key>.mp3 with Range support from a daemon thread; one per process
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            try:
+                _server = ThreadingHTTPServer((host, port), _make_handler(store))
+            except OSError:
+                # Another app process on this host already serves the same directory
+                return None
+            threading.Thread(target=_server.serve_forever, name="audio-http", daemon=True).start()
+        return _server
+
+
+def audio_url(key):
+    return f"{AUDIO_BASE_URL}/audio/{key}.mp3"
@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import edge_tts
+import google.generativeai as genai
+import numpy as np
+from google.generativeai import client as genai_client
+
+import debate_engine
+import metrics
+import transcription
+
+WORDS = (
+    "evidence suggests that social platforms amplify outrage while also connecting isolated communities "
+    "and the net effect depends on design incentives moderation policy and user age"
+).split()
+
+
+def fake_sentence(rng, n_words=14):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+
+
+class FakeStream:
+    def __init__(self, chunks, first_token_s, chunk_s):
+        self._chunks = chunks
+        self._first_token_s = first_token_s
+        self._chunk_s = chunk_s
+
+    async def __aiter__(self):
+        for i, chunk in enumerate(self._chunks):
+            await asyncio.sleep(self._first_token_s if i == 0 else self._chunk_s)
+            yield SimpleNamespace(text=chunk)
+
+
+class FakeGenerativeModel:
+    # Stand-in for genai.GenerativeModel with configurable latency and chunking
+    config = None
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._rng = random.Random()
+
+    async def generate_content_async(self, prompt, stream=False):
+        cfg = FakeGenerativeModel.config
+        if "strict debate coach" in prompt:
+            await asyncio.sleep(cfg.eval_latency_s)
+            return SimpleNamespace(text=f"Score: {self._rng.randint(40, 95)}\nFeedback: {fake_sentence(self._rng)}")
+
+        reply = " ".join(fake_sentence(self._rng) for _ in range(cfg.reply_sentences))
+        if not stream:
+            await asyncio.sleep(cfg.first_token_s + cfg.chunk_s * cfg.chunks)
+            return SimpleNamespace(text=reply)
+        size = max(1, len(reply) // cfg.chunks)
+        chunks = [reply[i:i + size] for i in range(0, len(reply), size)]
+        return FakeStream(chunks, cfg.first_token_s, cfg.chunk_s)
+
+
+class FakeCommunicate:
+    # Stand-in for edge_tts.Communicate; latency scales with the text length
+    config = None
+
+    def __init__(self, text, voice, rate="+0%"):
+        self.text = text
+
+    async def stream(self):
+        cfg = FakeCommunicate.config
+        await asyncio.sleep(cfg.tts_base_s + cfg.tts_per_char_s * len(self.text))
+        yield {"type": "audio", "data": b"\xff\xfb" * (len(self.text) * 20)}
+
+
+class FakeWhisperModel:
+    def __init__(self, latency_per_audio_s):
+        self.latency_per_audio_s = latency_per_audio_s
+
+    def transcribe(self, audio, fp16=False):
+        time.sleep(len(audio) / transcription.WHISPER_SAMPLE_RATE * self.latency_per_audio_s)
+        text = "I believe the evidence supports my position."
+        if transcription.WHISPER_BACKEND == "faster-whisper":
+            return [SimpleNamespace(text=text)], None
+        return {"text": text}
+
+
+@contextlib.contextmanager
+def fake_upstreams(args):
+    FakeGenerativeModel.config = args
+    FakeCommunicate.config = args
+    patches = [
+        (genai, "configure", lambda **kwargs: None),
+        (genai, "GenerativeModel", FakeGenerativeModel),
+        (genai_client, "get_default_generative_client", lambda: None),
+        (genai_client, "get_default_generative_async_client", lambda: None),
+        (edge_tts, "Communicate", FakeCommunicate),
+    ]
+    if not args.real_whisper:
+        fake_model = FakeWhisperModel(args.whisper_rtf)
+        patches.append((transcription, "load_whisper_model", lambda: fake_model))
+
+    originals = [(obj, name, getattr(obj, name)) for obj, name, _ in patches]
+    for obj, name, value in patches:
+        setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        for obj, name, value in originals:
+            setattr(obj, name, value)
+
+
+def synthetic_recording(seconds, sample_rate=44100):
+    # Noise bursts separated by quiet gaps, encoded the way audio_recorder delivers it
+    rng = np.random.default_rng(0)
+    samples = rng.standard_normal(int(seconds * sample_rate)) * 0.002
+    for start in np.arange(0.5, seconds - 1, 2.0):
+        begin = int(start * sample_rate)
+        samples[begin:begin + int(1.4 * sample_rate)] *= 100
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def run_debate(args, index, recording, record):
+    # Distinct topics keep identical prompts from being coalesced into one upstream call,
+    # which would measure a single session's work however many sessions run
+    topic = "Social Media does more harm than good"
+    if not args.shared_topic:
+        topic = f"{topic} (debate {index})"
+    # Likewise a key per debate, so the scheduler's per-key rate limit doesn't become the
+    # thing being measured
+    api_key = "bench-key" if args.shared_key else f"bench-key-{index}"
+    session = debate_engine.DebateSession(topic, "Pro (Agree)", api_key, max_rounds=args.rounds)
+    for _ in range(args.rounds):
+        started = time.perf_counter()
+        user_text = transcription.transcribe_audio_bytes(recording)
+        record("transcription", time.perf_counter() - started)
+
+        started = time.perf_counter()
+        session.submit_argument(user_text)
+        record("submit_argument", time.perf_counter() - started)
+
+        started = time.perf_counter()
+        first_token = []
+
+        def on_partial(partial):
+            if not first_token:
+                first_token.append(time.perf_counter() - started)
+
+        def on_first_audio(clip):
+            record("ai_first_audio", time.perf_counter() - started)
+
+        session.respond(user_text, on_partial, on_first_audio)
+        record("ai_reply_total", time.perf_counter() - started)
+        if first_token:
+            record("ai_first_token", first_token[0])
+
+        started = time.perf_counter()
+        session.advance_round()
+        if session.finished:
+            record("evaluation_report", time.perf_counter() - started)
+
+
+def percentile_summary(values):
+    ordered = np.asarray(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(ordered, 50)) * 1000, 2),
+        "p95_ms": round(float(np.percentile(ordered, 95)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(ordered, 99)) * 1000, 2),
+        "max_ms": round(float(ordered.max()) * 1000, 2),
+    }
+
+
+COLD_IMPORTS = ("metrics", "transcription", "debate_engine", "google.generativeai", "edge_tts", "whisper")
+
+
+def measure_cold_imports(modules=COLD_IMPORTS):
+    # Each module is imported in a fresh interpreter, which is what a new Streamlit process pays
+    results = {}
+    for module in modules:
+        code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        results[module] = round(float(output.strip()) * 1000, 1)
+    return results
+
+
+def run_benchmark(args):
+    timings = {}
+    lock = threading.Lock()
+
+    def record(stage, seconds):
+        with lock:
+            timings.setdefault(stage, []).append(seconds)
+
+    recording = synthetic_recording(args.recording_seconds)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Keep benchmark audio out of the real caches
+        debate_engine.TTS_CACHE_DIR = f"{cache_dir}/tts"
+        debate_engine.RESPONSE_CACHE_PATH = f"{cache_dir}/responses.sqlite3"
+        with fake_upstreams(args):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+                jobs = [pool.submit(run_debate, args, i, recording, record) for i in range(args.sessions * args.debates)]
+                for job in jobs:
+                    job.result()
+            elapsed = time.perf_counter() - started
+
+    debates = args.sessions * args.debates
+    report = {
+        "config": vars(args),
+        "wall_seconds": round(elapsed, 3),
+        "debates_per_second": round(debates / elapsed, 3),
+        "turns_per_second": round(debates * args.rounds / elapsed, 3),
+        "stages": {stage: percentile_summary(values) for stage, values in sorted(timings.items())},
+        "tts_cache": debate_engine.get_tts_cache().stats(),
+        "spans": metrics.REGISTRY.snapshot(),
+    }
+    if args.cold_start:
+        report["cold_import_ms"] = measure_cold_imports()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive full debates against local Gemini / edge_tts stand-ins.")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions")
+    parser.add_argument("--debates", type=int, default=1, help="Debates per session")
+    parser.add_argument("--rounds", type=int, default=debate_engine.DEFAULT_ROUNDS)
+    parser.add_argument("--first-token-s", type=float, default=0.4)
+    parser.add_argument("--chunk-s", type=float, default=0.05)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--reply-sentences", type=int, default=5)
+    parser.add_argument("--eval-latency-s", type=float, default=1.5)
+    parser.add_argument("--tts-base-s", type=float, default=0.2)
+    parser.add_argument("--tts-per-char-s", type=float, default=0.002)
+    parser.add_argument("--recording-seconds", type=float, default=20.0)
+    parser.add_argument("--whisper-rtf", type=float, default=0.1, help="Fake Whisper seconds per second of audio")
+    parser.add_argument("--real-whisper", action="store_true", help="Use the configured Whisper model")
+    parser.add_argument("--shared-topic", action="store_true", help="Give every debate the same topic, so overlapping calls coalesce")
+    parser.add_argument("--shared-key", action="store_true", help="Give every debate the same API key, so they share one rate limit")
+    parser.add_argument("--cold-start", action="store_true", help="Also time module imports in fresh interpreters")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = json.dumps(run_benchmark(args), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,611 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import io
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+import metrics
+from audio_store import AudioStore
+from response_cache import ResponseCache, prompt_cache_key
+from scheduler import EVALUATION, INTERACTIVE, GeminiScheduler
+from session_store import open_session_store
+from single_flight import SingleFlight
+from tts_cache import TTSCache, speech_cache_key
+
+load_dotenv()
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "20"))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "3"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "10"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+ARGUMENT_TOKEN_LIMIT = int(os.getenv("ARGUMENT_TOKEN_LIMIT", "400"))
+MAX_ROUNDS = int(os.getenv("MAX_ROUNDS", "20"))
+TTS_VOICE = os.getenv("TTS_VOICE", "en-US-ChristopherNeural")
+TTS_RATE = os.getenv("TTS_RATE", "+0%")
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MEMORY_MB = int(os.getenv("TTS_CACHE_MEMORY_MB", "32"))
+TTS_CACHE_DISK_MB = int(os.getenv("TTS_CACHE_DISK_MB", "512"))
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500"))
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(24 * 3600)))
+AUDIO_STORE_DIR = os.getenv("AUDIO_STORE_DIR", "audio_store")
+AUDIO_STORE_MB = int(os.getenv("AUDIO_STORE_MB", "1024"))
+
+DEFAULT_ROUNDS = 3
+# edge_tts output format audio-24khz-48kbitrate-mono-mp3
+TTS_BITS_PER_SECOND = 48000
+
+def _process_singleton(factory):
+    # lru_cache plus a lock: one shared instance per argument tuple for the whole process.
+    # Each factory has its own lock, so a slow one (a Gemini model waiting on the upstream
+    # loop) never holds up the others. Code running on the upstream loop must not call
+    # these at all; resolve what it needs on the calling thread and pass it in.
+    cached = functools.lru_cache(maxsize=None)(factory)
+    lock = threading.RLock()
+
+    @functools.wraps(factory)
+    def get(*args):
+        with lock:
+            return cached(*args)
+    return get
+
+
+@_process_singleton
+def get_event_loop():
+    # One long-lived loop for all upstream Gemini / edge_tts I/O in this process
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="upstream-loop", daemon=True).start()
+    return loop
+
+
+def submit_async(coro):
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_async(coro, timeout=None):
+    future = submit_async(coro)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        # Cancel the upstream call if we time out or the script run is interrupted
+        future.cancel()
+        raise
+
+
+async def backoff_sleep(attempt):
+    # Full jitter: spreads retries from many sessions instead of synchronizing them
+    await asyncio.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+
+
+@contextlib.asynccontextmanager
+async def _unscheduled():
+    yield
+
+
+async def with_retry(make_call, timeout, attempts=UPSTREAM_RETRIES, slot=None):
+    # slot() gives a context each attempt waits in first; queueing doesn't count against timeout
+    for attempt in range(attempts):
+        try:
+            async with (slot or _unscheduled)():
+                return await asyncio.wait_for(make_call(), timeout)
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            await backoff_sleep(attempt)
+
+
+_STREAM_DONE = object()
+
+
+async def _next_chunk(agen):
+    try:
+        return await agen.__anext__()
+    except StopAsyncIteration:
+        return _STREAM_DONE
+
+
+def iterate_async(agen, timeout):
+    # Bridges an async generator running on the upstream loop into a plain iterator
+    try:
+        while True:
+            chunk = run_async(_next_chunk(agen), timeout)
+            if chunk is _STREAM_DONE:
+                return
+            yield chunk
+    finally:
+        submit_async(agen.aclose())
+
+
+def preload_modules():
+    # google.generativeai and edge_tts are imported where they are first used so the
+    # landing page paints without them; this pays that cost in the background instead
+    def load():
+        import edge_tts  # noqa: F401
+        import google.generativeai  # noqa: F401
+    thread = threading.Thread(target=load, name="preload-modules", daemon=True)
+    thread.start()
+    return thread
+
+
+async def _create_async_client():
+    from google.generativeai import client as genai_client
+    return genai_client.get_default_generative_async_client()
+
+
+@_process_singleton
+def get_gemini_scheduler():
+    # One queue for every Gemini call in the process, on the upstream loop
+    return GeminiScheduler(GEMINI_MAX_CONCURRENCY, GEMINI_RPM, GEMINI_BURST)
+
+
+@_process_singleton
+def get_single_flight():
+    return SingleFlight()
+
+
+def gemini_slot(api_key, priority):
+    scheduler = get_gemini_scheduler()
+    return lambda: scheduler.slot(api_key, priority)
+
+
+@_process_singleton
+def get_gemini_model(api_key, model_name=GEMINI_MODEL):
+    # One model per (key, model name) for the whole process. genai.configure is global,
+    # so the client is created and pinned to the model while this key is configured;
+    # later calls reuse that client and its open connection.
+    import google.generativeai as genai
+    from google.generativeai import client as genai_client
+
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(model_name)
+    model._client = genai_client.get_default_generative_client()
+    # The async client is bound to the loop it is created on
+    model._async_client = run_async(_create_async_client(), LLM_TIMEOUT)
+    return model
+
+
+def clean_text_content(text):
+    clean = re.sub(r'<[^>]*>', '', text)
+    return clean.strip()
+
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_sentences(buffer):
+    # Returns the complete sentences in buffer plus the unfinished remainder
+    parts = SENTENCE_END.split(buffer)
+    return [p for p in parts[:-1] if p.strip()], parts[-1]
+
+
+async def generate_speech_async(text, voice=TTS_VOICE, rate=TTS_RATE):
+    # Collect the MP3 stream in memory so concurrent sessions never share a file
+    import edge_tts
+
+    communicate = edge_tts.Communicate(text, voice, rate=rate)
+    buffer = io.BytesIO()
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            buffer.write(chunk["data"])
+    return buffer.getvalue()
+
+
+@_process_singleton
+def get_tts_cache():
+    return TTSCache(TTS_CACHE_DIR, TTS_CACHE_MEMORY_MB * 1024 * 1024, TTS_CACHE_DISK_MB * 1024 * 1024)
+
+
+async def _synthesize_and_cache(cache, text):
+    audio = await with_retry(lambda: generate_speech_async(text), TTS_TIMEOUT)
+    await asyncio.to_thread(cache.put, text, TTS_VOICE, TTS_RATE, audio)
+    return audio
+
+
+async def cached_speech_async(cache, flights, text):
+    with metrics.span("tts", chars=len(text)) as attrs:
+        audio = await asyncio.to_thread(cache.get, text, TTS_VOICE, TTS_RATE)
+        attrs["cache_hit"] = int(audio is not None)
+        if audio is None:
+            # Sessions speaking the same sentence at the same moment share one synthesis
+            key = ("tts", speech_cache_key(text, TTS_VOICE, TTS_RATE))
+            audio = await flights.do(key, lambda: _synthesize_and_cache(cache, text))
+        attrs["audio_bytes"] = len(audio)
+    return audio
+
+
+def synthesize_speech(text):
+    return submit_async(cached_speech_async(get_tts_cache(), get_single_flight(), text))
+
+
+def queue_speech(tts_jobs, text):
+    spoken = clean_text_content(text)
+    if spoken:
+        tts_jobs.append(synthesize_speech(spoken))
+
+
+def speech_seconds(audio):
+    # edge_tts always returns constant-bitrate MP3, so the length gives the duration
+    return len(audio) * 8 / TTS_BITS_PER_SECOND
+
+
+def collect_speech(tts_jobs):
+    # MP3 frames are self-contained, so the per-sentence clips play back-to-back when joined
+    return b"".join(job.result() for job in tts_jobs)
+
+
+def estimate_tokens(text):
+    # Rough English average of ~4 characters per token; good enough for budgeting
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text, max_tokens=ARGUMENT_TOKEN_LIMIT):
+    # Caps one earlier argument in the history so no single entry can blow the prompt budget.
+    # The argument being answered or graded is always sent whole.
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max_tokens * 4].rsplit(" ", 1)[0] + "..."
+
+
+def summarize_history_line(line, max_chars=160):
+    first_sentence = SENTENCE_END.split(line, maxsplit=1)[0]
+    if len(first_sentence) > max_chars:
+        first_sentence = first_sentence[:max_chars].rsplit(" ", 1)[0] + "..."
+    return first_sentence
+
+
+def new_history_context():
+    return {"seen": 0, "recent": [], "recent_tokens": 0, "summary": [], "summary_tokens": 0}
+
+
+def update_history_context(context, debate_history, token_budget=HISTORY_TOKEN_BUDGET):
+    # Each entry is cleaned exactly once; older rounds are folded into one-line
+    # summaries whenever the recent verbatim lines exceed the token budget.
+    if context["seen"] > len(debate_history):
+        context.update(new_history_context())
+
+    for h in debate_history[context["seen"]:]:
+        line = f"Round {h['round']} - {h['speaker']}: {truncate_to_tokens(clean_text_content(h['argument']))}"
+        context["recent"].append(line)
+        context["recent_tokens"] += estimate_tokens(line)
+        context["seen"] += 1
+
+    while context["recent_tokens"] + context["summary_tokens"] > token_budget and len(context["recent"]) > 2:
+        line = context["recent"].pop(0)
+        context["recent_tokens"] -= estimate_tokens(line)
+        summary = summarize_history_line(line)
+        context["summary"].append(summary)
+        context["summary_tokens"] += estimate_tokens(summary)
+
+    # Summaries get at most half the budget; the oldest ones are dropped first
+    while context["summary_tokens"] > token_budget // 2 and context["summary"]:
+        context["summary_tokens"] -= estimate_tokens(context["summary"].pop(0))
+
+    if not context["summary"]:
+        return "\n".join(context["recent"])
+    return "Earlier rounds (summarized):\n" + "\n".join(context["summary"]) + "\n\nRecent rounds:\n" + "\n".join(context["recent"])
+
+
+def build_debate_prompt(topic, user_role, ai_role, debate_history, user_argument, context_cache=None):
+    if context_cache is None:
+        context_cache = new_history_context()
+    history_context = update_history_context(context_cache, debate_history)
+    return f"""You are in a debate about: "{topic}"
+Role: {ai_role} | Opponent: {user_role}
+
+History:
+{history_context}
+
+Opponent's latest argument:
+{user_argument}
+
+Reply with a counter-argument.
+1. Be persuasive and logical.
+2. Keep it under 150 words.
+3. Address the specific point made.
+4. STRICTLY OUTPUT PLAIN TEXT ONLY. DO NOT USE MARKDOWN OR HTML.
+"""
+
+
+async def stream_gemini_async(model, prompt, api_key, scheduler):
+    for attempt in range(UPSTREAM_RETRIES):
+        started = False
+        try:
+            # The slot is held for the whole stream, which is one upstream request
+            async with scheduler.slot(api_key, INTERACTIVE):
+                response = await asyncio.wait_for(model.generate_content_async(prompt, stream=True), LLM_TIMEOUT)
+                async for chunk in response:
+                    if chunk.text:
+                        started = True
+                        yield chunk.text
+            return
+        except Exception:
+            # Only retry before anything has been shown to the user
+            if started or attempt == UPSTREAM_RETRIES - 1:
+                raise
+            await backoff_sleep(attempt)
+
+
+def stream_ai_response(topic, user_role, ai_role, debate_history, user_argument, api_key, context_cache=None):
+    model = get_gemini_model(api_key)
+    with metrics.span("build_prompt") as attrs:
+        prompt = build_debate_prompt(topic, user_role, ai_role, debate_history, user_argument, context_cache)
+        attrs["prompt_tokens"] = estimate_tokens(prompt)
+    # Identical prompts in flight together (e.g. openings on the default topic) share one
+    # stream. The first chunk may wait in the scheduler queue and through retries, hence
+    # the wider bound.
+    # The key is part of it: a call made with another session's key would spend that
+    # key's quota and hand its errors (an invalid key, a 429) to everyone waiting
+    key = ("gemini_stream", hashlib.sha256(api_key.encode("utf-8")).hexdigest(), prompt_cache_key(model.model_name, prompt))
+    scheduler = get_gemini_scheduler()
+    shared = get_single_flight().stream(key, lambda: stream_gemini_async(model, prompt, api_key, scheduler))
+    return iterate_async(shared, LLM_TIMEOUT * UPSTREAM_RETRIES)
+
+
+ROUND_SCORE = re.compile(r'Score:\s*(\d{1,3})')
+
+
+async def grade_async(model, prompt, slot):
+    response = await with_retry(lambda: model.generate_content_async(prompt), LLM_TIMEOUT, slot=slot)
+    # .text raises for a blocked grade; resolving it here leaves the future with plain
+    # review text or an exception, never a response object that fails later
+    return clean_text_content(response.text)
+
+
+def submit_round_evaluation(topic, user_role, debate_history, api_key):
+    # Grades the user's latest argument in the background while the AI replies
+    model = get_gemini_model(api_key)
+    user_entry = debate_history[-1]
+    rebutted = [h for h in debate_history[:-1] if h["speaker"] == "AI"]
+    opponent = truncate_to_tokens(clean_text_content(rebutted[-1]["argument"])) if rebutted else "(none, the user opened the debate)"
+    prompt = f"""Act as a strict debate coach.
+Topic: {topic}
+Side: {user_role}
+
+Opponent's previous argument:
+{opponent}
+
+The user's argument for Round {user_entry['round']}:
+{user_entry['argument']}
+
+Score this single round (0-100) based on logic and give brief feedback.
+STRICTLY OUTPUT PLAIN TEXT ONLY.
+
+Format:
+Score: [0-100]
+Feedback: [Your feedback]
+"""
+    return submit_async(grade_async(model, prompt, gemini_slot(api_key, EVALUATION)))
+
+
+def build_evaluation_report(round_evaluations):
+    # Only aggregates the per-round results, which have normally finished by now
+    sections = []
+    scores = []
+    for round_num in sorted(round_evaluations):
+        try:
+            review = round_evaluations[round_num].result(LLM_TIMEOUT * UPSTREAM_RETRIES)
+        except Exception as e:
+            review = f"Score: N/A\nFeedback: Error: {e}"
+        match = ROUND_SCORE.search(review)
+        if match:
+            scores.append(min(int(match.group(1)), 100))
+        sections.append(f"Round {round_num}:\n{review}")
+
+    overall = round(sum(scores) / len(scores)) if scores else "N/A"
+    return f"Overall Score: {overall}/100\n\n" + "\n\n".join(sections)
+
+
+@_process_singleton
+def get_response_cache():
+    return ResponseCache(RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES)
+
+
+@_process_singleton
+def get_session_store():
+    return open_session_store(SESSION_STORE, SESSION_TTL)
+
+
+@_process_singleton
+def get_audio_store():
+    return AudioStore(AUDIO_STORE_DIR, AUDIO_STORE_MB * 1024 * 1024)
+
+
+def completed_evaluation(review):
+    # Same shape as a finished submit_round_evaluation future, for grades restored from a store
+    future = Future()
+    future.set_result(review)
+    return future
+
+
+class DebateSession:
+    # Complete state of one debate. Nothing here touches Streamlit, so rounds can be
+    # driven from tests, benchmarks or any other front end.
+
+    def __init__(self, topic, user_role, api_key, first_speaker="User", max_rounds=DEFAULT_ROUNDS):
+        self.session_id = uuid.uuid4().hex
+        self.topic = topic
+        self.user_role = user_role
+        self.ai_role = "Con" if "Pro" in user_role else "Pro"
+        self.first_speaker = first_speaker
+        self.api_key = api_key
+        self.max_rounds = max(1, min(max_rounds, MAX_ROUNDS))
+        self.current_round = 1
+        self.history = []
+        self.history_context = new_history_context()
+        self.round_evaluations = {}
+        self.evaluation_report = None
+        self.audio_key = None
+        self.tts_error = None
+
+    @property
+    def finished(self):
+        return self.current_round > self.max_rounds
+
+    @property
+    def needs_opening(self):
+        return self.first_speaker == "AI" and self.current_round == 1 and not self.history
+
+    def to_dict(self):
+        # JSON-safe snapshot for a session store. The API key stays out of it, and grades
+        # still in flight are saved as None and regraded by whichever process loads them.
+        reviews = {}
+        for round_num, evaluation in self.round_evaluations.items():
+            finished = evaluation.done() and not evaluation.cancelled() and evaluation.exception() is None
+            reviews[str(round_num)] = evaluation.result() if finished else None
+        return {
+            "session_id": self.session_id,
+            "topic": self.topic,
+            "user_role": self.user_role,
+            "first_speaker": self.first_speaker,
+            "max_rounds": self.max_rounds,
+            "current_round": self.current_round,
+            "history": self.history,
+            "round_reviews": reviews,
+            "evaluation_report": self.evaluation_report,
+            "audio_key": self.audio_key,
+        }
+
+    @classmethod
+    def from_dict(cls, data, api_key):
+        session = cls(data["topic"], data["user_role"], api_key, data["first_speaker"], data["max_rounds"])
+        session.session_id = data["session_id"]
+        session.current_round = data["current_round"]
+        session.history = data["history"]
+        session.evaluation_report = data["evaluation_report"]
+        session.audio_key = data["audio_key"]
+        for key, review in data["round_reviews"].items():
+            round_num = int(key)
+            if review is not None:
+                session.round_evaluations[round_num] = completed_evaluation(review)
+            elif session.evaluation_report is None:
+                session.round_evaluations[round_num] = session.regrade_round(round_num)
+        return session
+
+    def regrade_round(self, round_num):
+        index = next(i for i, h in enumerate(self.history) if h["speaker"] == "You" and h["round"] == round_num)
+        try:
+            return submit_round_evaluation(self.topic, self.user_role, self.history[:index + 1], self.api_key)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+            return future
+
+    def add_entry(self, speaker, argument):
+        # Entries are never edited or removed, so the position doubles as a stable id
+        role = self.user_role if speaker == "You" else self.ai_role
+        self.history.append({"id": len(self.history), "round": self.current_round, "speaker": speaker, "role": role, "argument": argument})
+
+    def submit_argument(self, user_text):
+        self.add_entry("You", user_text)
+        started = time.perf_counter()
+        evaluation = submit_round_evaluation(self.topic, self.user_role, self.history, self.api_key)
+        evaluation.add_done_callback(lambda _: metrics.record("round_evaluation", time.perf_counter() - started))
+        self.round_evaluations[self.current_round] = evaluation
+
+    def respond(self, user_argument, on_partial=None, on_first_audio=None):
+        # Streams the AI reply, calling on_partial with the text so far, and returns
+        # (reply, mp3_bytes). mp3_bytes is None if synthesis failed; see tts_error.
+        # on_first_audio gets the first sentence's clip as soon as it is synthesized,
+        # usually while the reply is still streaming; mp3_bytes then starts with it.
+        tts_jobs = []
+        partial = ""
+        unspoken = ""
+        first_audio_sent = on_first_audio is None
+        started = time.perf_counter()
+
+        def send_first_audio(wait):
+            nonlocal first_audio_sent
+            if first_audio_sent or not tts_jobs or not (wait or tts_jobs[0].done()):
+                return
+            first_audio_sent = True
+            try:
+                clip = tts_jobs[0].result()
+            except Exception:
+                return
+            metrics.record("ai_first_audio", time.perf_counter() - started)
+            on_first_audio(clip)
+
+        try:
+            for chunk in stream_ai_response(self.topic, self.user_role, self.ai_role, self.history, user_argument, self.api_key, self.history_context):
+                if not partial:
+                    metrics.record("ai_first_token", time.perf_counter() - started)
+                partial += chunk
+                if on_partial:
+                    on_partial(partial)
+
+                # Synthesize finished sentences while the rest of the reply is still generating
+                sentences, unspoken = split_sentences(unspoken + chunk)
+                for sentence in sentences:
+                    queue_speech(tts_jobs, sentence)
+                send_first_audio(wait=False)
+            ai_reply = clean_text_content(partial)
+            queue_speech(tts_jobs, unspoken)
+        except Exception as e:
+            ai_reply = f"Error: {e}"
+            for job in tts_jobs:
+                job.cancel()
+            tts_jobs = []
+            queue_speech(tts_jobs, ai_reply)
+        # The first clip can play while the remaining sentences are synthesized
+        send_first_audio(wait=True)
+
+        self.add_entry("AI", ai_reply)
+        metrics.record("ai_stream", time.perf_counter() - started, reply_tokens=estimate_tokens(ai_reply), sentences=len(tts_jobs))
+
+        self.tts_error = None
+        with metrics.span("tts_wait") as attrs:
+            try:
+                audio_bytes = collect_speech(tts_jobs)
+                attrs["audio_bytes"] = len(audio_bytes)
+            except Exception as e:
+                self.tts_error = str(e)
+                attrs["errors"] = 1
+                audio_bytes = None
+        return ai_reply, audio_bytes
+
+    def opening_statement(self, on_partial=None, on_first_audio=None):
+        # The opening depends only on topic and roles, so repeated setups are served from disk
+        cache = get_response_cache()
+        prompt = build_debate_prompt(self.topic, self.user_role, self.ai_role, [], "Opening Statement")
+        key = prompt_cache_key(GEMINI_MODEL, TTS_VOICE, TTS_RATE, prompt)
+
+        with metrics.span("opening_cache_lookup") as attrs:
+            cached = cache.get(key)
+            attrs["cache_hit"] = int(bool(cached))
+        if cached:
+            ai_reply, audio_bytes = cached
+            self.add_entry("AI", ai_reply)
+            return ai_reply, audio_bytes
+
+        ai_reply, audio_bytes = self.respond("Opening Statement", on_partial, on_first_audio)
+        if audio_bytes and not ai_reply.startswith("Error:"):
+            cache.put(key, ai_reply, audio_bytes)
+        return ai_reply, audio_bytes
+
+    def advance_round(self):
+        self.current_round += 1
+        if self.finished:
+            with metrics.span("evaluation_report", rounds=len(self.round_evaluations)):
+                self.evaluation_report = build_evaluation_report(self.round_evaluations)
+
+    def play_round(self, user_text, on_partial=None):
+        # One complete round for headless callers: argument, AI reply, next round
+        self.submit_argument(user_text)
+        ai_reply, audio_bytes = self.respond(user_text, on_partial)
+        self.advance_round()
+        return ai_reply, audio_bytes
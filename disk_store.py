@@ -0,0 +1,84 @@
+import os
+import threading
+
+
+class DiskBlobStore:
+    # A directory of content-addressed <key><suffix> files held under a byte budget. Writes
+    # go through a temp file and os.replace, so readers never see a partial file; once over
+    # budget the least recently used files (by mtime) are removed first.
+
+    def __init__(self, directory, budget_bytes, suffix=".mp3"):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._entries())
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return self._bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def read(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        self.touch(path)
+        return data
+
+    def write(self, key, data):
+        path = self.path(key)
+        if os.path.exists(path):
+            # Same key, same content: only the access time needs refreshing
+            self.touch(path)
+            return
+
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._bytes += len(data)
+            over_budget = self._bytes > self.budget_bytes
+        if over_budget:
+            self._evict()
+
+    def touch(self, path):
+        # mtime doubles as last access; atime is unreliable on relatime/noatime mounts
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.suffix):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.budget_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        with self._lock:
+            self._bytes = total
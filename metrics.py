@@ -0,0 +1,196 @@
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", "5"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RECENT_SAMPLES = 256
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    # Process-wide stage timings: a cumulative histogram per stage for export, recent
+    # samples for percentiles, and summed numeric attributes (tokens, bytes, cache hits).
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._attributes = {}
+        self._gauges = {}
+        self._counters = {}
+        self.recent_spans = deque(maxlen=50)
+
+    def record(self, stage, seconds, attributes=None):
+        attributes = attributes or {}
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "buckets": [0] * len(DURATION_BUCKETS),
+                    "recent": deque(maxlen=RECENT_SAMPLES),
+                }
+            entry["count"] += 1
+            entry["sum"] += seconds
+            entry["recent"].append(seconds)
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+
+            for name, value in attributes.items():
+                if isinstance(value, (bool, int, float)):
+                    key = (stage, name)
+                    self._attributes[key] = self._attributes.get(key, 0) + value
+            self.recent_spans.append({"stage": stage, "seconds": round(seconds, 4), **attributes})
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            stages = {}
+            for stage, entry in sorted(self._stages.items()):
+                ordered = sorted(entry["recent"])
+                stages[stage] = {
+                    "count": entry["count"],
+                    "p50_ms": round(_percentile(ordered, 0.50) * 1000, 1),
+                    "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1),
+                    "last_ms": round(entry["recent"][-1] * 1000, 1),
+                }
+            attributes = {f"{stage}.{name}": value for (stage, name), value in sorted(self._attributes.items())}
+            return {"stages": stages, "attributes": attributes, "gauges": dict(self._gauges), "counters": dict(self._counters)}
+
+    def render_prometheus(self):
+        lines = [
+            "# HELP debate_stage_duration_seconds Wall time of each debate pipeline stage.",
+            "# TYPE debate_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage, entry in sorted(self._stages.items()):
+                stage_label = _label(stage)
+                for bound, count in zip(DURATION_BUCKETS, entry["buckets"]):
+                    lines.append(f'debate_stage_duration_seconds_bucket{{stage="{stage_label}",le="{bound}"}} {count}')
+                lines.append(f'debate_stage_duration_seconds_bucket{{stage="{stage_label}",le="+Inf"}} {entry["count"]}')
+                lines.append(f'debate_stage_duration_seconds_sum{{stage="{stage_label}"}} {entry["sum"]}')
+                lines.append(f'debate_stage_duration_seconds_count{{stage="{stage_label}"}} {entry["count"]}')
+
+            lines.append("# HELP debate_stage_attribute_total Sum of numeric span attributes per stage.")
+            lines.append("# TYPE debate_stage_attribute_total counter")
+            for (stage, name), value in sorted(self._attributes.items()):
+                lines.append(f'debate_stage_attribute_total{{stage="{_label(stage)}",attribute="{_label(name)}"}} {float(value)}')
+
+            for name, value in sorted(self._gauges.items()):
+                lines.append(f"# TYPE debate_{name} gauge")
+                lines.append(f"debate_{name} {float(value)}")
+            for name, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE debate_{name}_total counter")
+                lines.append(f"debate_{name}_total {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+_file_lock = threading.Lock()
+_last_file_write = 0.0
+
+
+def write_metrics_file(path=None):
+    path = path or METRICS_FILE
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def _maybe_write_metrics_file():
+    # Throttled so a burst of spans costs one file write, not one per span
+    global _last_file_write
+    if not METRICS_FILE:
+        return
+    now = time.monotonic()
+    with _file_lock:
+        if now - _last_file_write < METRICS_FILE_INTERVAL:
+            return
+        _last_file_write = now
+    try:
+        write_metrics_file()
+    except OSError:
+        pass
+
+
+def record(stage, seconds, **attributes):
+    REGISTRY.record(stage, seconds, attributes)
+    _maybe_write_metrics_file()
+
+
+def set_gauge(name, value):
+    REGISTRY.set_gauge(name, value)
+
+
+def increment(name, amount=1):
+    REGISTRY.increment(name, amount)
+
+
+@contextlib.contextmanager
+def span(stage, **attributes):
+    # Times the block; the yielded dict can be filled with attributes as they become known
+    started = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException:
+        attributes["errors"] = 1
+        raise
+    finally:
+        record(stage, time.perf_counter() - started, **attributes)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT):
+    # Serves /metrics from a daemon thread; one server per process however often it is called
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            _server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
@@ -0,0 +1,65 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+
+def prompt_cache_key(*parts):
+    # Whitespace and case differences in the topic shouldn't produce separate entries
+    normalized = "\n".join(re.sub(r"\s+", " ", str(part)).strip().casefold() for part in parts)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    # Persistent text + MP3 cache in SQLite with a TTL and LRU eviction by entry count
+
+    def __init__(self, path, ttl_seconds=7 * 24 * 3600, max_entries=500):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                audio BLOB,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, audio, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            text, audio, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return text, audio
+
+    def put(self, key, text, audio=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, text, audio, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, text, audio, now, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                """DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,),
+            )
+            self._conn.commit()
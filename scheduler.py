@@ -0,0 +1,132 @@
+import asyncio
+import contextlib
+import itertools
+import time
+
+import metrics
+
+INTERACTIVE = 0
+EVALUATION = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", EVALUATION: "evaluation"}
+
+
+def is_rate_limited(error):
+    # google.api_core raises ResourceExhausted for HTTP 429; match by name to avoid importing it
+    return type(error).__name__ == "ResourceExhausted" or "429" in str(error)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second, burst):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate_per_second)
+        self.updated = now
+
+    def try_take(self, now):
+        # Returns 0 when a token was taken, otherwise the seconds until one is available
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate_per_second
+
+    def drain(self, now, seconds):
+        # After a quota error, hold this key back instead of letting queued calls hit it again
+        self._refill(now)
+        self.tokens = min(self.tokens, 0) - seconds * self.rate_per_second
+
+
+class GeminiScheduler:
+    # Admits upstream Gemini calls in priority order, at most max_concurrency at a time
+    # and no faster than each API key's token bucket allows. Lives on the upstream loop,
+    # so its state is only touched from that one thread.
+
+    def __init__(self, max_concurrency=8, requests_per_minute=60, burst=10, throttle_seconds=10):
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = requests_per_minute / 60
+        self.burst = burst
+        self.throttle_seconds = throttle_seconds
+        self.active = 0
+        self._waiting = []
+        self._order = itertools.count()
+        self._buckets = {}
+        self._timer = None
+
+    def _bucket(self, api_key):
+        bucket = self._buckets.get(api_key)
+        if bucket is None:
+            bucket = self._buckets[api_key] = TokenBucket(self.rate_per_second, self.burst)
+        return bucket
+
+    def _publish_depth(self):
+        metrics.set_gauge("gemini_queue_depth", len(self._waiting))
+        metrics.set_gauge("gemini_active_requests", self.active)
+
+    def _dispatch(self):
+        self._timer = None
+        now = time.monotonic()
+        next_token = None
+        still_waiting = []
+        # Highest priority first; a key that is out of tokens doesn't hold up other keys
+        for entry in sorted(self._waiting):
+            _, _, api_key, future = entry
+            if future.done():
+                continue
+            if self.active >= self.max_concurrency:
+                still_waiting.append(entry)
+                continue
+            delay = self._bucket(api_key).try_take(now)
+            if delay:
+                still_waiting.append(entry)
+                next_token = delay if next_token is None else min(next_token, delay)
+                continue
+            self.active += 1
+            future.set_result(None)
+
+        self._waiting = still_waiting
+        if next_token is not None and self.active < self.max_concurrency:
+            self._timer = asyncio.get_running_loop().call_later(next_token, self._dispatch)
+        self._publish_depth()
+
+    def _wake(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+
+    async def acquire(self, api_key, priority=INTERACTIVE):
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((priority, next(self._order), api_key, future))
+        started = time.perf_counter()
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted and cancelled in the same tick: hand the slot back
+                self.release()
+            raise
+        metrics.record(f"gemini_queue_wait_{PRIORITY_NAMES.get(priority, priority)}", time.perf_counter() - started)
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    def throttle(self, api_key):
+        self._bucket(api_key).drain(time.monotonic(), self.throttle_seconds)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, api_key, priority=INTERACTIVE):
+        await self.acquire(api_key, priority)
+        try:
+            yield
+        except Exception as e:
+            if is_rate_limited(e):
+                self.throttle(api_key)
+                metrics.increment("gemini_rate_limited")
+            raise
+        finally:
+            self.release()
@@ -0,0 +1,109 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class MemorySessionStore:
+    # Single-process default: sessions live in this process only
+
+    def __init__(self, ttl_seconds=24 * 3600):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def save(self, session_id, data):
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = (json.dumps(data), now)
+            # Abandoned tabs are never loaded again, so expiry can't wait for load()
+            expired = [key for key, (_, updated_at) in self._sessions.items() if now - updated_at > self.ttl_seconds]
+            for key in expired:
+                del self._sessions[key]
+
+    def load(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or time.time() - entry[1] > self.ttl_seconds:
+                self._sessions.pop(session_id, None)
+                return None
+            return json.loads(entry[0])
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore:
+    # Shared by every app process on one host; WAL lets readers and a writer overlap
+
+    def __init__(self, path, ttl_seconds=24 * 3600):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def save(self, session_id, data):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), now),
+            )
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+            self._conn.commit()
+
+    def load(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.ttl_seconds),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+
+
+class RedisSessionStore:
+    # Any Redis-protocol server (Redis, Valkey, KeyDB, ...); keys expire on their own
+
+    def __init__(self, url, ttl_seconds=24 * 3600, prefix="debate"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SESSION_STORE=redis://... requires the redis package (pip install redis)") from e
+        self.ttl_seconds = int(ttl_seconds)
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def save(self, session_id, data):
+        self._client.set(f"{self.prefix}:session:{session_id}", json.dumps(data), ex=self.ttl_seconds)
+
+    def load(self, session_id):
+        raw = self._client.get(f"{self.prefix}:session:{session_id}")
+        return json.loads(raw) if raw else None
+
+    def delete(self, session_id):
+        self._client.delete(f"{self.prefix}:session:{session_id}")
+
+
+def open_session_store(url, ttl_seconds=24 * 3600):
+    # "memory", "sqlite:///path/to/sessions.sqlite3" or "redis://host:6379/0"
+    if not url or url == "memory":
+        return MemorySessionStore(ttl_seconds)
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):], ttl_seconds)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSessionStore(url, ttl_seconds)
+    raise ValueError(f"Unsupported SESSION_STORE: {url}")
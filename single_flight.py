@@ -0,0 +1,75 @@
+import asyncio
+
+import metrics
+
+
+class _SharedStream:
+    # Pumps one upstream async generator and replays its chunks to every subscriber,
+    # including ones that join after it started
+
+    def __init__(self, agen):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self._updated = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(agen))
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def _pump(self, agen):
+        try:
+            async for chunk in agen:
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+            self._notify()
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            if position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            elif self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await self._updated.wait()
+
+
+class SingleFlight:
+    # Identical requests that overlap in time share one upstream call. Only used from the
+    # upstream event loop, so the in-flight tables need no lock. Keys are (kind, digest)
+    # tuples; kind names the counter that tracks how many calls were saved.
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+
+    async def do(self, key, make_call):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_call())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            metrics.increment(f"coalesced_{key[0]}")
+        # One caller giving up must not cancel the call for everyone else waiting on it
+        return await asyncio.shield(task)
+
+    async def stream(self, key, make_agen):
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = _SharedStream(make_agen())
+            self._streams[key] = shared
+            shared.task.add_done_callback(lambda _: self._streams.pop(key, None))
+        else:
+            metrics.increment(f"coalesced_{key[0]}")
+        async for chunk in shared.subscribe():
+            yield chunk
@@ -0,0 +1,31 @@
+import os
+
+from audio_store import AudioStore
+from disk_store import DiskBlobStore
+from tts_cache import TTSCache
+
+
+def test_least_recently_used_files_are_evicted_over_budget(tmp_path):
+    store = DiskBlobStore(str(tmp_path), budget_bytes=250)
+    for i, key in enumerate("ab"):
+        store.write(key, bytes(100))
+        os.utime(store.path(key), (i, i))
+    store.touch(store.path("a"))
+    store.write("c", bytes(100))
+
+    assert store.read("b") is None
+    assert store.read("a") == bytes(100)
+    assert store.total_bytes == 200
+    assert DiskBlobStore(str(tmp_path), budget_bytes=250).total_bytes == 200
+
+
+def test_audio_store_and_tts_cache_share_the_disk_behaviour(tmp_path):
+    audio = AudioStore(str(tmp_path / "audio"), budget_bytes=1024)
+    key = audio.put(b"mp3 data")
+    assert audio.get(key) == b"mp3 data"
+    assert audio.put(b"mp3 data") == key and audio.total_bytes == len(b"mp3 data")
+
+    cache = TTSCache(str(tmp_path / "tts"), memory_budget_bytes=0, disk_budget_bytes=1024)
+    cache.put("Hello.", "voice", "+0%", b"clip")
+    assert cache.get("Hello.", "voice", "+0%") == b"clip"
+    assert cache.stats()["disk_hits"] == 1 and cache.stats()["disk_bytes"] == 4
@@ -0,0 +1,79 @@
+import asyncio
+
+from scheduler import EVALUATION, INTERACTIVE, GeminiScheduler
+
+
+def test_interactive_calls_are_admitted_before_queued_evaluations():
+    async def scenario():
+        scheduler = GeminiScheduler(max_concurrency=1, requests_per_minute=6000, burst=100)
+        admitted = []
+
+        async def call(name, priority):
+            async with scheduler.slot("key", priority):
+                admitted.append(name)
+                await asyncio.sleep(0.01)
+
+        holder = asyncio.create_task(call("holder", INTERACTIVE))
+        await asyncio.sleep(0)
+        queued = [asyncio.create_task(call("grade-1", EVALUATION)), asyncio.create_task(call("grade-2", EVALUATION))]
+        await asyncio.sleep(0)
+        queued.append(asyncio.create_task(call("turn", INTERACTIVE)))
+        await asyncio.gather(holder, *queued)
+        return admitted
+
+    assert asyncio.run(scenario()) == ["holder", "turn", "grade-1", "grade-2"]
+
+
+def test_no_more_than_max_concurrency_calls_run_at_once():
+    async def scenario():
+        scheduler = GeminiScheduler(max_concurrency=2, requests_per_minute=6000, burst=100)
+        running = 0
+        peak = 0
+
+        async def call(i):
+            nonlocal running, peak
+            async with scheduler.slot(f"key-{i % 3}"):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(call(i) for i in range(7)))
+        return peak, scheduler.active
+
+    assert asyncio.run(scenario()) == (2, 0)
+
+
+def test_cancelling_a_queued_call_does_not_leak_its_slot():
+    async def scenario():
+        scheduler = GeminiScheduler(max_concurrency=1, requests_per_minute=6000, burst=100)
+        await scheduler.acquire("key")
+        queued = asyncio.create_task(scheduler.acquire("key"))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        scheduler.release()
+
+        # The cancelled waiter must neither hold the slot nor block the next caller
+        await asyncio.wait_for(scheduler.acquire("key"), 1)
+        active = scheduler.active
+        scheduler.release()
+        return queued.cancelled(), active, scheduler.active, len(scheduler._waiting)
+
+    assert asyncio.run(scenario()) == (True, 1, 0, 0)
+
+
+def test_each_key_is_held_to_its_own_burst():
+    async def scenario():
+        scheduler = GeminiScheduler(max_concurrency=10, requests_per_minute=60, burst=2)
+        for _ in range(2):
+            await scheduler.acquire("a")
+        third = asyncio.create_task(scheduler.acquire("a"))
+        other = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0.05)
+        state = (third.done(), other.done())
+        third.cancel()
+        await asyncio.gather(third, return_exceptions=True)
+        return state
+
+    assert asyncio.run(scenario()) == (False, True)
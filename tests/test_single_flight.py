@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_overlapping_calls_share_one_upstream_call():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def upstream():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "reply"
+
+        results = await asyncio.gather(*(flights.do(("gemini", "k"), upstream) for _ in range(5)))
+        return results, calls
+
+    assert asyncio.run(scenario()) == (["reply"] * 5, 1)
+
+
+def test_one_waiter_giving_up_does_not_cancel_the_others():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def upstream():
+            await asyncio.sleep(0.02)
+            return "reply"
+
+        first = asyncio.create_task(flights.do(("tts", "k"), upstream))
+        second = asyncio.create_task(flights.do(("tts", "k"), upstream))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == "reply"
+
+
+def test_stream_errors_reach_every_subscriber_after_the_chunks_they_missed():
+    async def scenario():
+        flights = SingleFlight()
+        started = 0
+
+        async def upstream():
+            nonlocal started
+            started += 1
+            yield "first"
+            await asyncio.sleep(0.01)
+            yield "second"
+            raise RuntimeError("quota exceeded")
+
+        async def subscriber(delay):
+            await asyncio.sleep(delay)
+            chunks = []
+            with pytest.raises(RuntimeError, match="quota exceeded"):
+                async for chunk in flights.stream(("gemini_stream", "k"), upstream):
+                    chunks.append(chunk)
+            return chunks
+
+        # The second subscriber joins after "first" has already gone out
+        results = await asyncio.gather(subscriber(0), subscriber(0.005))
+        return results, started, flights._streams
+
+    assert asyncio.run(scenario()) == ([["first", "second"], ["first", "second"]], 1, {})
@@ -0,0 +1,38 @@
+import numpy as np
+
+import transcription
+
+SAMPLE_RATE = transcription.WHISPER_SAMPLE_RATE
+
+
+def syllables(seconds, peak, rng, floor=0.0):
+    # A voiced carrier with ~4 syllables a second, roughly how speech energy moves;
+    # floor > 0 keeps the voice going between syllables, as in continuous speech
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = floor + (1 - floor) * np.abs(np.sin(2 * np.pi * 2 * t)) ** 2
+    carrier = np.sin(2 * np.pi * 180 * t) + 0.3 * rng.standard_normal(len(t))
+    return (peak * envelope * carrier / np.abs(carrier).max()).astype(np.float32)
+
+
+def test_speech_in_a_noisy_room_is_kept():
+    rng = np.random.default_rng(0)
+    samples = syllables(8, 0.15, rng) + (rng.standard_normal(8 * SAMPLE_RATE) * 0.05).astype(np.float32)
+    assert len(transcription.trim_silence(samples)) > 0
+
+
+def test_clip_that_is_all_speech_is_kept():
+    samples = syllables(8, 0.3, np.random.default_rng(1), floor=0.4)
+    assert len(transcription.trim_silence(samples)) > 0
+
+
+def test_quiet_speech_over_a_quiet_floor_is_kept():
+    rng = np.random.default_rng(2)
+    samples = (rng.standard_normal(6 * SAMPLE_RATE) * 0.0003).astype(np.float32)
+    samples[2 * SAMPLE_RATE:4 * SAMPLE_RATE] += syllables(2, 0.02, rng)
+    assert 0 < len(transcription.trim_silence(samples)) < len(samples)
+
+
+def test_near_digital_silence_is_dropped():
+    rng = np.random.default_rng(3)
+    samples = (rng.standard_normal(3 * SAMPLE_RATE) * transcription.VAD_MIN_RMS / 4).astype(np.float32)
+    assert len(transcription.trim_silence(samples)) == 0
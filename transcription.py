@@ -0,0 +1,359 @@
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "openai")
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "float32")
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))
+WHISPER_CHUNK_SECONDS = float(os.getenv("WHISPER_CHUNK_SECONDS", "28"))
+VAD_SPEECH_RATIO = float(os.getenv("VAD_SPEECH_RATIO", "3"))
+VAD_MIN_RMS = float(os.getenv("VAD_MIN_RMS", "0.0003"))
+VAD_MAX_PAUSE_SECONDS = float(os.getenv("VAD_MAX_PAUSE_SECONDS", "0.6"))
+
+WHISPER_SAMPLE_RATE = 16000
+WHISPER_WINDOW_SECONDS = 30
+# Anti-aliasing filter for downsampling: cutoff as a fraction of the 16 kHz target rate
+RESAMPLE_CUTOFF = 0.45
+RESAMPLE_TAPS = 129
+VAD_FRAME_SECONDS = 0.03
+VAD_PADDING_SECONDS = 0.2
+BATCH_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".webm")
+
+_MODEL_LOCK = threading.Lock()
+# openai-whisper keeps the decoder's key/value cache in forward hooks on the shared model,
+# so two threads decoding at once overwrite each other's cache; faster-whisper is thread-safe
+_DECODE_LOCK = threading.Lock() if WHISPER_BACKEND != "faster-whisper" else contextlib.nullcontext()
+
+
+def max_parallel_transcriptions(requested):
+    return requested if WHISPER_BACKEND == "faster-whisper" else 1
+
+
+@functools.lru_cache(maxsize=None)
+def _load_whisper_model():
+    if WHISPER_BACKEND == "faster-whisper":
+        # Optional CTranslate2 backend, needed for int8 inference on CPU
+        from faster_whisper import WhisperModel
+        model = WhisperModel(WHISPER_MODEL, device="auto", compute_type=WHISPER_COMPUTE_TYPE, cpu_threads=WHISPER_THREADS)
+    else:
+        if WHISPER_COMPUTE_TYPE not in ("float32", "float16"):
+            raise ValueError(f"WHISPER_COMPUTE_TYPE={WHISPER_COMPUTE_TYPE} requires WHISPER_BACKEND=faster-whisper")
+        if WHISPER_THREADS:
+            import torch
+            torch.set_num_threads(WHISPER_THREADS)
+        # Imported here: whisper pulls in torch, which nobody should pay for until they record
+        import whisper
+        model = whisper.load_model(WHISPER_MODEL)
+
+    # Warm-up pass so the first real recording doesn't pay for lazy initialization
+    run_whisper(model, np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32))
+    return model
+
+
+def load_whisper_model():
+    # Process-wide model; the lock keeps concurrent first callers from loading it twice
+    with _MODEL_LOCK:
+        return _load_whisper_model()
+
+
+def run_whisper(model, audio):
+    audio_seconds = len(audio) / WHISPER_SAMPLE_RATE if isinstance(audio, np.ndarray) else 0
+    with metrics.span("whisper", audio_seconds=audio_seconds):
+        if WHISPER_BACKEND == "faster-whisper":
+            segments, _ = model.transcribe(audio)
+            return "".join(segment.text for segment in segments).strip()
+        with _DECODE_LOCK:
+            return model.transcribe(audio, fp16=WHISPER_COMPUTE_TYPE == "float16")["text"].strip()
+
+
+def lowpass(samples, cutoff_hz, sample_rate, taps=RESAMPLE_TAPS):
+    # Windowed-sinc FIR; symmetric, so mode="same" keeps it aligned with the input
+    t = np.arange(taps) - (taps - 1) / 2
+    kernel = np.sinc(2 * cutoff_hz / sample_rate * t) * np.hamming(taps)
+    return np.convolve(samples, (kernel / kernel.sum()).astype(samples.dtype), mode="same")
+
+
+def decode_wav_bytes(audio_bytes):
+    # Decode PCM WAV straight into the float32 16 kHz mono array Whisper expects
+    with wave.open(io.BytesIO(audio_bytes), "rb") as wav:
+        sample_rate = wav.getframerate()
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        frames = wav.readframes(wav.getnframes())
+
+    if sample_width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    elif sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {sample_width} bytes")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+
+    if sample_rate != WHISPER_SAMPLE_RATE and len(samples):
+        if sample_rate > WHISPER_SAMPLE_RATE:
+            # Remove everything above the new Nyquist first, or it folds back into the speech band
+            samples = lowpass(samples, RESAMPLE_CUTOFF * WHISPER_SAMPLE_RATE, sample_rate)
+        duration = len(samples) / sample_rate
+        target_times = np.arange(int(duration * WHISPER_SAMPLE_RATE)) / WHISPER_SAMPLE_RATE
+        source_times = np.arange(len(samples)) / sample_rate
+        samples = np.interp(target_times, source_times, samples)
+
+    return samples.astype(np.float32)
+
+
+def frame_energy(samples, frame_len):
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[: n_frames * frame_len].reshape(n_frames, frame_len)
+    return np.sqrt(np.mean(frames ** 2, axis=1))
+
+
+def trim_silence(samples):
+    # Drops leading/trailing silence and shortens pauses to VAD_MAX_PAUSE_SECONDS.
+    # Returns an empty array only when the whole clip is below VAD_MIN_RMS.
+    frame_len = int(WHISPER_SAMPLE_RATE * VAD_FRAME_SECONDS)
+    energy = frame_energy(samples, frame_len)
+    if not len(energy):
+        return samples[:0]
+
+    # Only a clip that never rises above near-digital silence skips Whisper
+    if energy.max() <= VAD_MIN_RMS:
+        return samples[:0]
+
+    # Relative to this clip's own noise floor, so quiet microphones still register speech
+    noise_floor = np.percentile(energy, 10)
+    speech = energy > max(noise_floor * VAD_SPEECH_RATIO, VAD_MIN_RMS)
+    if not speech.any():
+        # A noisy room or a clip that is speech throughout: nothing stands out from the
+        # floor, so there is nothing safe to trim and Whisper gets the whole clip
+        return samples
+
+    # Pad around speech so soft word onsets and endings survive
+    pad = int(VAD_PADDING_SECONDS / VAD_FRAME_SECONDS)
+    keep = np.convolve(speech.astype(np.int8), np.ones(2 * pad + 1, dtype=np.int8), mode="same") > 0
+
+    silent = np.concatenate(([0], (~keep).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(silent))
+    max_pause = int(VAD_MAX_PAUSE_SECONDS / VAD_FRAME_SECONDS)
+    for start, end in zip(edges[::2], edges[1::2]):
+        if start > 0 and end < len(keep):
+            keep[start:start + max_pause] = True
+
+    return samples[: len(keep) * frame_len][np.repeat(keep, frame_len)]
+
+
+def split_on_silence(samples, max_seconds=WHISPER_CHUNK_SECONDS):
+    # Packs the clip into windows of at most max_seconds, cutting each one at the
+    # quietest ~300 ms in its last third so words are not split across windows
+    frame_len = int(WHISPER_SAMPLE_RATE * VAD_FRAME_SECONDS)
+    energy = frame_energy(samples, frame_len)
+    max_frames = int(max_seconds / VAD_FRAME_SECONDS)
+    if len(energy) <= max_frames:
+        return [(0, len(samples))]
+    smoothed = np.convolve(energy, np.ones(10) / 10, mode="same")
+
+    windows = []
+    start = 0
+    while len(smoothed) - start > max_frames:
+        search_from = start + max_frames * 2 // 3
+        cut = search_from + int(np.argmin(smoothed[search_from:start + max_frames]))
+        windows.append((start * frame_len, cut * frame_len))
+        start = cut
+    windows.append((start * frame_len, len(samples)))
+    return windows
+
+
+def transcribe_samples(samples):
+    return run_whisper(load_whisper_model(), samples)
+
+
+def transcribe_audio_bytes(audio_bytes):
+    whisper_model = load_whisper_model()
+    try:
+        audio = decode_wav_bytes(audio_bytes)
+    except (wave.Error, ValueError):
+        # Non-PCM recordings still go through ffmpeg, via a per-call temp file
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+            f.write(audio_bytes)
+        try:
+            return run_whisper(whisper_model, f.name)
+        finally:
+            os.remove(f.name)
+
+    audio = trim_silence(audio)
+    if not len(audio):
+        return ""
+    return run_whisper(whisper_model, audio)
+
+
+def load_clip(path):
+    if path.lower().endswith(".wav"):
+        try:
+            with open(path, "rb") as f:
+                return decode_wav_bytes(f.read())
+        except (wave.Error, ValueError):
+            pass
+    # Compressed formats are decoded by ffmpeg, resampled to 16 kHz mono
+    import whisper
+    return whisper.load_audio(path)
+
+
+def clip_length_hint(path):
+    # Cheap sort key in seconds: exact for PCM WAV headers, estimated from
+    # file size at ~128 kbps otherwise. Only used to group similar lengths.
+    if path.lower().endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as wav:
+                return wav.getnframes() / wav.getframerate()
+        except (wave.Error, EOFError):
+            pass
+    return os.path.getsize(path) / 16000
+
+
+def decode_padded_batch(model, clips):
+    # One forward pass for several clips that each fit in a single 30 s window
+    import torch
+    import whisper
+    mels = torch.stack([whisper.log_mel_spectrogram(whisper.pad_or_trim(clip), model.dims.n_mels) for clip in clips])
+    options = whisper.DecodingOptions(fp16=WHISPER_COMPUTE_TYPE == "float16")
+    with _DECODE_LOCK:
+        results = whisper.decode(model, mels.to(model.device), options)
+    return [result.text.strip() for result in results]
+
+
+def transcribe_batch(paths):
+    model = load_whisper_model()
+    records = []
+    single_window = []
+    for path in paths:
+        record = {"path": path, "speech_seconds": 0.0, "text": ""}
+        records.append(record)
+        try:
+            audio = trim_silence(load_clip(path))
+            record["speech_seconds"] = round(len(audio) / WHISPER_SAMPLE_RATE, 2)
+            if not len(audio):
+                continue
+            if WHISPER_BACKEND != "faster-whisper" and len(audio) <= WHISPER_WINDOW_SECONDS * WHISPER_SAMPLE_RATE:
+                single_window.append((record, audio))
+            else:
+                record["text"] = run_whisper(model, audio)
+        except Exception as e:
+            record["error"] = str(e)
+
+    if single_window:
+        try:
+            texts = decode_padded_batch(model, [audio for _, audio in single_window])
+            for (record, _), text in zip(single_window, texts):
+                record["text"] = text
+        except Exception as e:
+            for record, _ in single_window:
+                record["error"] = str(e)
+    return records
+
+
+def _init_batch_worker(threads):
+    if WHISPER_BACKEND != "faster-whisper":
+        import torch
+        torch.set_num_threads(threads)
+    load_whisper_model()
+
+
+def iter_batch_transcriptions(paths, batch_size=8, workers=1):
+    # Clips are sorted by length and cut into batches, so each padded batch
+    # wastes little compute on padding; batches are spread over worker processes.
+    ordered = sorted(paths, key=clip_length_hint)
+    batches = [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+    if workers <= 1:
+        for batch in batches:
+            yield from transcribe_batch(batch)
+        return
+
+    threads = WHISPER_THREADS or max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker, initargs=(threads,)) as pool:
+        for job in as_completed([pool.submit(transcribe_batch, batch) for batch in batches]):
+            yield from job.result()
+
+
+def score_transcripts(records, topic, side, api_key):
+    # Each speech is graded as a single round by the app's coach prompt. Everything is
+    # submitted up front; the Gemini scheduler paces the calls to the key's rate limit.
+    import debate_engine
+
+    jobs = []
+    for record in records:
+        if record["text"]:
+            history = [{"id": 0, "round": 1, "speaker": "You", "role": side, "argument": record["text"]}]
+            jobs.append((record, debate_engine.submit_round_evaluation(topic, side, history, api_key)))
+
+    for record, job in jobs:
+        try:
+            review = job.result()
+        except Exception as e:
+            record["score_error"] = str(e)
+            continue
+        match = debate_engine.ROUND_SCORE.search(review)
+        record["score"] = min(int(match.group(1)), 100) if match else None
+        record["feedback"] = review
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-transcribe a folder of recorded speeches to JSONL.")
+    parser.add_argument("folder", help="Folder to scan recursively for audio clips")
+    parser.add_argument("-o", "--output", default="transcripts.jsonl", help="JSONL file to write")
+    parser.add_argument("--batch-size", type=int, default=8, help="Clips decoded together in one padded batch")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each with its own model")
+    parser.add_argument("--score", action="store_true", help="Also grade each speech with the debate coach (needs GEMINI_API_KEY)")
+    parser.add_argument("--topic", help="Debate topic the speeches argue; required with --score")
+    parser.add_argument("--side", default="Pro (Agree)", help="Side the speeches argue, for --score")
+    args = parser.parse_args(argv)
+    api_key = os.getenv("GEMINI_API_KEY")
+    if args.score and not args.topic:
+        parser.error("--score requires --topic")
+    if args.score and not api_key:
+        parser.error("--score requires GEMINI_API_KEY")
+
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(args.folder)
+        for name in names
+        if name.lower().endswith(BATCH_EXTENSIONS)
+    )
+
+    started = time.perf_counter()
+    count = 0
+    records = iter_batch_transcriptions(paths, args.batch_size, args.workers)
+    if args.score:
+        records = score_transcripts(list(records), args.topic, args.side, api_key)
+    with open(args.output, "w", encoding="utf-8") as out:
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed * 60 if elapsed else 0.0
+    print(f"{'Transcribed and scored' if args.score else 'Transcribed'} {count} clips in {elapsed:.1f}s ({rate:.1f} clips/min) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
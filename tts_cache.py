@@ -0,0 +1,77 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from disk_store import DiskBlobStore
+
+
+def speech_cache_key(text, voice, rate):
+    return hashlib.sha256(f"{voice}\n{rate}\n{text}".encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    # Content-addressed MP3 cache: a byte-bounded in-memory LRU in front of a
+    # byte-bounded directory of <key>.mp3 files evicted by last access time.
+
+    def __init__(self, directory, memory_budget_bytes=32 * 1024 * 1024, disk_budget_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.memory_budget_bytes = memory_budget_bytes
+        self.disk_budget_bytes = disk_budget_bytes
+        self._disk = DiskBlobStore(directory, disk_budget_bytes, suffix=".mp3")
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, text, voice, rate):
+        key = speech_cache_key(text, voice, rate)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return audio
+
+        audio = self._disk.read(key)
+        if audio is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, text, voice, rate, audio):
+        key = speech_cache_key(text, voice, rate)
+        self._disk.write(key, audio)
+        with self._lock:
+            self._remember(key, audio)
+
+    def _remember(self, key, audio):
+        if len(audio) > self.memory_budget_bytes:
+            return
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.memory_budget_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_bytes": self._memory_bytes,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk.total_bytes,
+            }